@@ -2,143 +2,184 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
-import math
-import random
+import asyncio
 from datetime import datetime
 import logging
-from typing import Optional
-import json
 from misc.garageapi import GarageAPI
-from misc.db import get_db, User, SystemConfig, Log
-from misc.bankapi import AsyncBankClient, PaymentRequest, PaymentResponse
+from misc.db import get_db, init_db, User, Log, Garage, DEFAULT_GARAGE_ID
 from misc.config_manager import ConfigManager
 from misc.utils import distance
-from misc.models import LocationData, LoginData, PurchaseData
-
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
-from sqlalchemy.orm import Session
+from misc.ratelimit import login_guard
+from misc.logs import setup_logging, new_correlation_id
+from misc.events import Debouncer
+from misc.devices import EVENTS_TOKEN
+from misc.render import (
+    get_start_keyboard, get_main_keyboard, get_location_keyboard, EMPTY_KEYBOARD,
+    render, render_status, render_state_notification, log_pages
+)
 
-# Load .env
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, TypeHandler, ContextTypes, filters
 
-# Setup logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Constants
 API_TOKEN = os.getenv("API_TOKEN")
-GARAGE_LOCATION = json.loads(os.getenv("GARAGE_LOCATION"))
 GARAGE_PRICE = float(os.getenv("GARAGE_PRICE", "100.0"))
-
-def get_start_keyboard(is_available: bool = True) -> ReplyKeyboardMarkup:
-    buttons = [
-        [KeyboardButton("Купить гараж")] if is_available else [],
-        [KeyboardButton("Ввести пароль")]
-    ]
-    return ReplyKeyboardMarkup(buttons, resize_keyboard=True)
-
-def get_main_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup([
-        [KeyboardButton("Пароль")],
-        [KeyboardButton("Открыть"), KeyboardButton("Закрыть")],
-        [KeyboardButton("Статус")]  # New button
-    ], resize_keyboard=True)
-
-def get_location_keyboard() -> ReplyKeyboardMarkup:
-    return ReplyKeyboardMarkup([[KeyboardButton("Переключить", request_location=True)]], 
-                              resize_keyboard=True, one_time_keyboard=True)
+# Users are notified once a state has held this long; changes in between are merged
+NOTIFY_DEBOUNCE = float(os.getenv("NOTIFY_DEBOUNCE", "5"))
+# A full door move takes about 6 s and the device reports every 5 s, so
+# "moving" can be reported for up to 10 s before the final state arrives
+NOTIFY_MOVING_HOLD = float(os.getenv("NOTIFY_MOVING_HOLD", "15"))
+# Telegram allows about 30 messages per second per bot
+NOTIFY_BATCH_SIZE = 25
 
 class GarageBot:
     def __init__(self):
-        self.application = Application.builder().token(API_TOKEN).build()
+        self.application = (
+            Application.builder()
+            .token(API_TOKEN)
+            .post_init(self.start_notifications)
+            .post_shutdown(self.stop_notifications)
+            .build()
+        )
+        self.notifications = Debouncer(self.notify_users, NOTIFY_DEBOUNCE, hold={"moving": NOTIFY_MOVING_HOLD})
+        self.events_task = None
         self.setup_handlers()
 
     def setup_handlers(self):
+        # Group -1 runs first for every update and tags it with a correlation ID
+        self.application.add_handler(TypeHandler(Update, self.bind_correlation_id), group=-1)
         self.application.add_handler(CommandHandler("start", self.start))
         self.application.add_handler(CommandHandler("exit", self.exit))
         self.application.add_handler(CommandHandler("logs", self.logs))
         self.application.add_handler(MessageHandler(filters.LOCATION, self.handle_location))
         self.application.add_handler(MessageHandler(filters.TEXT, self.handle_message))
 
+    async def start_notifications(self, application: Application):
+        if not EVENTS_TOKEN:
+            # server.py refuses unauthenticated subscribers; don't retry forever
+            logger.warning("EVENTS_TOKEN is not set, garage state notifications are disabled")
+            return
+        self.events_task = asyncio.create_task(self.consume_events())
+
+    async def stop_notifications(self, application: Application):
+        self.notifications.cancel()
+        if self.events_task:
+            self.events_task.cancel()
+
+    async def consume_events(self):
+        async for event in GarageAPI.events():
+            if event.get("type") == "state_changed":
+                self.notifications.push(event["device_id"], event["state"], event.get("previous"))
+
+    async def notify_users(self, device_id: str, state: str):
+        db = next(get_db())
+        garage = db.query(Garage).filter_by(device_id=device_id).first()
+        if not garage:
+            return
+        chat_ids = [user_id for (user_id,) in db.query(User.id).filter_by(garage_id=garage.id, is_auth=True)]
+        text = render_state_notification(state)
+
+        for i in range(0, len(chat_ids), NOTIFY_BATCH_SIZE):
+            if i:
+                await asyncio.sleep(1)
+            batch = chat_ids[i:i + NOTIFY_BATCH_SIZE]
+            results = await asyncio.gather(
+                *(self.application.bot.send_message(chat_id, text) for chat_id in batch),
+                return_exceptions=True
+            )
+            for chat_id, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    logger.warning("Failed to notify %s: %s", chat_id, result)
+
+    async def bind_correlation_id(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        new_correlation_id(f"tg-{update.update_id}")
+
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         db = next(get_db())
         
         user = db.query(User).get(user_id)
         if not user:
-            user = User(id=user_id)
+            user = User(id=user_id, garage_id=DEFAULT_GARAGE_ID)
             db.add(user)
             db.commit()
+
+        # Deep link /start <garage_id> switches the user's current garage.
+        # Ownership is kept on Garage.owner_id, so an owner who switches away
+        # gets their garage back by following its link again.
+        if context.args and context.args[0].isdigit():
+            garage = ConfigManager.get_garage(db, int(context.args[0]))
+            if garage and garage.id != user.garage_id:
+                user.garage_id = garage.id
+                user.is_owner = garage.owner_id == user_id
+                user.is_auth = user.is_owner
+                user.current_itern = None
+                db.commit()
+                await update.message.reply_text(render("garage_switched", garage_id=garage.id))
         
         if user.is_owner and user.is_auth:
             await update.message.reply_text(
-                "Добро пожаловать в панель управления!", 
+                render("control_panel"), 
                 reply_markup=get_main_keyboard()
             )
         else:
             await update.message.reply_text(
-                "🏠 Гараж-бот\n\n" +
-                ("🔑 Авторизуйтесь с помощью пароля\n"
-                 f"🏷 Гараж доступен к покупке за {GARAGE_PRICE} &$%&\n"),
+                render("welcome", price=GARAGE_PRICE),
                 reply_markup=get_start_keyboard()
             )
 
-    async def get_garage_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+    async def get_garage_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE, garage: Garage):
         try:
-            status = await GarageAPI.get_status()
+            status = await GarageAPI.get_status(garage.device_id)
             if "error" in status:
                 await update.message.reply_text(
-                    f"Ошибка получения статуса: {status['error']}",
+                    render("status_error", error=status['error']),
                     reply_markup=get_main_keyboard()
                 )
                 return
 
-            status_text = (
-                f"🌡 Температура: {status.get('temperature', 'N/A'):.1f}°C\n"  # .1f for 1 decimal place
-                f"💧 Влажность: {status.get('humidity', 'N/A'):.1f}%\n"        # .1f for 1 decimal place
-                f"🚪 Состояние: {'Открыто' if status.get('state') == 'open' else 'Закрыто'}"
-            )
-            
-            await update.message.reply_text(
-                status_text,
-                reply_markup=get_main_keyboard()
-            )
-            
-        except Exception as e:
-            logger.error(f"Failed to get garage status: {str(e)}")
             await update.message.reply_text(
-                "Ошибка получения статуса гаража",
+                render_status(status),
                 reply_markup=get_main_keyboard()
             )
             
         except Exception as e:
-            logger.error(f"Failed to get garage status: {str(e)}")
+            logger.error("Failed to get garage status: %s", e)
             await update.message.reply_text(
-                "Ошибка получения статуса гаража",
+                render("garage_status_error"),
                 reply_markup=get_main_keyboard()
             )
 
     async def check_password(self, update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
         db = next(get_db())
         user_id = update.effective_user.id
-        current_pass = ConfigManager.get_temp_password(db)
+        user = db.query(User).get(user_id)
+        current_pass = ConfigManager.get_temp_password(db, user.garage_id)
         
         if text == current_pass:
-            user = db.query(User).get(user_id)
             user.is_auth = True
             db.commit()
             
-            ConfigManager.reset_temp_password(db)
-            await update.message.reply_text("Доступ разрешен", reply_markup=get_main_keyboard())
+            ConfigManager.reset_temp_password(db, user.garage_id)
+            await update.message.reply_text(render("access_granted"), reply_markup=get_main_keyboard())
         else:
-            await update.message.reply_text("Неверный пароль")
+            await update.message.reply_text(render("wrong_password"))
 
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         text = update.message.text
+        guard_key = f"tg:{user_id}"
+
+        # Only text shaped like a temporary password can be a guess. Guesses go
+        # through the in-memory per-key check before any DB work; card numbers,
+        # menu buttons and commands never count against it
+        guess = ConfigManager.looks_like_password(text)
+        if guess and login_guard.check_local(guard_key):
+            await update.message.reply_text(render("too_many_attempts"))
+            return
+
         db = next(get_db())
         user = db.query(User).get(user_id)
 
@@ -151,26 +192,24 @@ class GarageBot:
 
         if text == "Купить гараж":
             await update.message.reply_text(
-                f"💳 Для покупки гаража введите номер карты (16 цифр).\n"
-                f"💰 Стоимость: {GARAGE_PRICE} руб."
+                render("buy_prompt", price=GARAGE_PRICE)
             )
             user.current_itern = 'awaiting_card'
             db.commit()
             return
             
         if text == "Ввести пароль":
-            await update.message.reply_text("Введите пароль:")
+            await update.message.reply_text(render("enter_password"))
             return
             
         if user and user.is_auth:
             # Handle main keyboard commands
             if text == "Статус":
-                await self.get_garage_status(update, context)
+                await self.get_garage_status(update, context, ConfigManager.get_garage(db, user.garage_id))
             elif text == "Пароль":
-                current_pass = ConfigManager.get_temp_password(db)
+                current_pass = ConfigManager.get_temp_password(db, user.garage_id)
                 await update.message.reply_text(
-                    f"Пароль: {current_pass}\n"
-                    f"https://t.me/new_garage_opener_Bot?start={current_pass}",
+                    render("password", password=current_pass, garage_id=user.garage_id),
                     reply_markup=get_main_keyboard()
                 )
             elif text in ["Открыть", "Закрыть"]:
@@ -181,23 +220,35 @@ class GarageBot:
                 user.current_itern = command_map[text]
                 db.commit()
                 await update.message.reply_text(
-                    "Нажмите кнопку для действия",
+                    render("press_button"),
                     reply_markup=get_location_keyboard()
                 )
         else:
             # Try to authenticate with password
-            current_pass = ConfigManager.get_temp_password(db)
-            if text == current_pass:
+            if not guess:
+                await update.message.reply_text(
+                    render("wrong_password"),
+                    reply_markup=get_start_keyboard()
+                )
+                return
+            garage_id = user.garage_id if user else DEFAULT_GARAGE_ID
+            if login_guard.check_shared(guard_key, garage_id):
+                await update.message.reply_text(render("too_many_attempts"))
+                return
+            current_pass = ConfigManager.get_temp_password(db, garage_id)
+            if user and text == current_pass:
                 user.is_auth = True
                 db.commit()
-                ConfigManager.reset_temp_password(db)
+                ConfigManager.reset_temp_password(db, garage_id)
+                login_guard.success(guard_key)
                 await update.message.reply_text(
-                    "Доступ разрешен", 
+                    render("access_granted"),
                     reply_markup=get_main_keyboard()
                 )
             else:
+                login_guard.failure(guard_key, garage_id)
                 await update.message.reply_text(
-                    "❌ Неверный пароль",
+                    render("wrong_password"),
                     reply_markup=get_start_keyboard()
                 )
 
@@ -206,11 +257,14 @@ class GarageBot:
             card_number = update.message.text
 
             if not card_number.isdigit() or len(card_number) != 16:
-                await update.message.reply_text("❌ Неверный формат карты")
+                await update.message.reply_text(render("card_format_error"))
                 return
 
+            from misc.bankapi import AsyncBankClient, PaymentRequest
+
             await update.message.delete()  # Delete card number for security
             user_id = update.effective_user.id
+            garage_id = user.garage_id or DEFAULT_GARAGE_ID
             
             try:
                 payment = PaymentRequest(
@@ -225,20 +279,23 @@ class GarageBot:
                     response = await bank.process_payment(payment)
                 
                 if response.status == "success":
-                    # Remove all old users
-                    db.query(User).delete()
+                    # Remove all old users of this garage
+                    db.query(User).filter_by(garage_id=garage_id).delete()
                     db.commit()
                     
                     # Create new owner
                     new_owner = User(
                         id=user_id,
+                        garage_id=garage_id,
                         is_owner=True,
                         is_auth=True
                     )
                     db.add(new_owner)
+                    ConfigManager.get_garage(db, garage_id).owner_id = user_id
                     
                     # Log the purchase
                     log = Log(
+                        garage_id=garage_id,
                         user=str(user_id),
                         action="garage_purchased",
                         timestamp=int(datetime.utcnow().timestamp())
@@ -247,20 +304,19 @@ class GarageBot:
                     db.commit()
                     
                     await update.message.reply_text(
-                        "🎉 Поздравляем с покупкой гаража!\n"
-                        "Теперь вы владелец.",
+                        render("purchase_done"),
                         reply_markup=get_main_keyboard()
                     )
                 else:
                     await update.message.reply_text(
-                        f"❌ Ошибка при оплате: {response.error_message}",
+                        render("payment_error", error=response.error_message),
                         reply_markup=get_start_keyboard(True)
                     )
                     
             except Exception as e:
-                logger.error(f"Purchase processing error: {str(e)}")
+                logger.error("Purchase processing error: %s", e)
                 await update.message.reply_text(
-                    "❌ Произошла ошибка при обработке покупки.",
+                    render("purchase_error"),
                     reply_markup=get_start_keyboard(True)
                 )
             finally:
@@ -277,20 +333,22 @@ class GarageBot:
         if not user or not user.current_itern:
             return
             
+        garage = ConfigManager.get_garage(db, user.garage_id)
         location = update.message.location
-        dist = distance(location.latitude, location.longitude, *GARAGE_LOCATION)
+        dist = distance(location.latitude, location.longitude, *garage.location)
         
         if dist > 1000:
             await update.message.reply_text(
-                "Вы слишком далеко от гаража",
+                render("too_far"),
                 reply_markup=get_main_keyboard()
             )
             return
             
-        result = await GarageAPI.open(user.current_itern, db, user_id)
+        result = await GarageAPI.open(user.current_itern, db, user_id, garage.device_id)
         
         # Log the action
         log = Log(
+            garage_id=garage.id,
             user=username or str(user_id),
             action=user.current_itern,
             timestamp=int(datetime.utcnow().timestamp())
@@ -299,7 +357,7 @@ class GarageBot:
         db.commit()
         
         await update.message.reply_text(
-            "Выполнено" if result == "Success" else result,
+            render("done") if result == "Success" else result,
             reply_markup=get_main_keyboard()
         )
         user.current_itern = None
@@ -313,13 +371,7 @@ class GarageBot:
         if not user or not user.is_auth:
             return
             
-        logs = db.query(Log).order_by(Log.timestamp.desc()).limit(50).all()
-        log_text = "\n".join([
-            f"{datetime.fromtimestamp(log.timestamp)}: User {log.user} - {log.action}"
-            for log in logs
-        ])
-        
-        await update.message.reply_text(f"Последние действия:\n{log_text}")
+        await update.message.reply_text(log_pages.get(db, user.garage_id))
 
     async def exit(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
@@ -329,13 +381,18 @@ class GarageBot:
         if user:
             user.is_auth = False
             db.commit()
-            await update.message.reply_text("Выход выполнен", reply_markup=ReplyKeyboardMarkup([]))
+            await update.message.reply_text(render("logged_out"), reply_markup=EMPTY_KEYBOARD)
 
     def run(self):
         self.application.run_polling()
 
-if __name__ == '__main__':
+def main():
+    setup_logging()
+    init_db()
     bot = GarageBot()
     with next(get_db()) as db:
         print("Current pass:", ConfigManager.get_temp_password(db))
-    bot.run()
\ No newline at end of file
+    bot.run()
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,5 @@
+# Purchases are rare: web.py and bot.py import this module inside their purchase
+# handlers, keeping it (and aiohttp) out of their startup path
 import os
 import uuid
 from dataclasses import dataclass
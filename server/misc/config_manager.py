@@ -1,6 +1,8 @@
 from datetime import datetime
 import random
-from .db import SystemConfig
+from .db import SystemConfig, Garage, GarageCredential, DEFAULT_GARAGE_ID
+
+TEMP_PASSWORD_DIGITS = 4
 
 class ConfigManager:
     @staticmethod
@@ -19,15 +21,28 @@ class ConfigManager:
         db.commit()
 
     @staticmethod
-    def get_temp_password(db):
-        password = ConfigManager.get_value(db, 'temp_password')
-        if not password:
-            password = str(random.randint(1000, 9999))
-            ConfigManager.set_value(db, 'temp_password', password)
-        return password
+    def get_garage(db, garage_id: int = DEFAULT_GARAGE_ID):
+        return db.query(Garage).get(garage_id)
+
+    @staticmethod
+    def get_temp_password(db, garage_id: int = DEFAULT_GARAGE_ID):
+        credential = db.query(GarageCredential).filter_by(garage_id=garage_id).first()
+        if credential and credential.temp_password:
+            return credential.temp_password
+        return ConfigManager.reset_temp_password(db, garage_id)
 
     @staticmethod
-    def reset_temp_password(db):
-        new_password = str(random.randint(1000, 9999))
-        ConfigManager.set_value(db, 'temp_password', new_password)
+    def looks_like_password(text: str) -> bool:
+        """Whether text could be a temporary password at all; anything else is not a guess."""
+        return len(text) == TEMP_PASSWORD_DIGITS and text.isdigit()
+
+    @staticmethod
+    def reset_temp_password(db, garage_id: int = DEFAULT_GARAGE_ID):
+        new_password = str(random.randint(10 ** (TEMP_PASSWORD_DIGITS - 1), 10 ** TEMP_PASSWORD_DIGITS - 1))
+        credential = db.query(GarageCredential).filter_by(garage_id=garage_id).first()
+        if credential:
+            credential.temp_password = new_password
+        else:
+            db.add(GarageCredential(garage_id=garage_id, temp_password=new_password))
+        db.commit()
         return new_password
\ No newline at end of file
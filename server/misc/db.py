@@ -1,15 +1,38 @@
-from sqlalchemy import create_engine, Column, Integer, Boolean, String, Text, DateTime
+import os
+import json
+from sqlalchemy import Column, Integer, Boolean, String, Text, DateTime, Float, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+from .dbconfig import make_engine
+from .migrations import migrate
+from .devices import DEFAULT_DEVICE_ID
 
-DATABASE_URL = "sqlite:///garage.db"
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///garage.db")
+DEFAULT_GARAGE_ID = 1
 Base = declarative_base()
 
+class Garage(Base):
+    __tablename__ = 'garages'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String)
+    device_id = Column(String, unique=True, index=True)  # ESP32 connects to /ws/<device_id>
+    latitude = Column(Float)
+    longitude = Column(Float)
+    owner_id = Column(Integer)  # telegram user id of the owner, if bought via bot
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    @property
+    def location(self):
+        return (self.latitude, self.longitude)
+
 class User(Base):
     __tablename__ = 'users'
-    
+
     id = Column(Integer, primary_key=True)
+    garage_id = Column(Integer, ForeignKey('garages.id'), index=True, default=DEFAULT_GARAGE_ID)
     is_auth = Column(Boolean, default=False)
     current_itern = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -17,28 +40,65 @@ class User(Base):
 
 class SystemConfig(Base):
     __tablename__ = 'system_config'
-    
+
     id = Column(Integer, primary_key=True)
     key = Column(String, unique=True)
     value = Column(Text)
     updated_at = Column(DateTime, default=datetime.utcnow)
 
+class GarageCredential(Base):
+    __tablename__ = 'garage_credentials'
+
+    id = Column(Integer, primary_key=True)
+    garage_id = Column(Integer, ForeignKey('garages.id'), unique=True, index=True)
+    temp_password = Column(String)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Log(Base):
     __tablename__ = 'logs'
-    
+    __table_args__ = (Index('ix_logs_garage_timestamp', 'garage_id', 'timestamp'),)
+
     id = Column(Integer, primary_key=True)
+    garage_id = Column(Integer, ForeignKey('garages.id'), default=DEFAULT_GARAGE_ID)
     user = Column(String)  # "web" or telegram user name
     action = Column(String)
     timestamp = Column(Integer)
 
-# Initialize database
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(engine)
+def _ensure_default_garage(session):
+    # Migration 2 creates the row; its location comes from the environment
+    garage = session.query(Garage).get(DEFAULT_GARAGE_ID)
+    if garage and garage.latitude is not None:
+        return
+    if not os.getenv("GARAGE_LOCATION"):
+        raise RuntimeError("GARAGE_LOCATION must be set to create the default garage, e.g. [55.75, 37.62]")
+    location = json.loads(os.getenv("GARAGE_LOCATION"))
+    if garage is None:
+        garage = Garage(id=DEFAULT_GARAGE_ID, name="default", device_id=DEFAULT_DEVICE_ID)
+        session.add(garage)
+    garage.latitude, garage.longitude = location[0], location[1]
+    try:
+        session.commit()
+    except IntegrityError:
+        # Another process created it first
+        session.rollback()
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine)
+_initialized = False
+
+def init_db():
+    """Migrates the schema. Call once per process from its entry point, not on import."""
+    global _initialized
+    if _initialized:
+        return
+    migrate(engine)
+    with SessionLocal() as session:
+        _ensure_default_garage(session)
+    _initialized = True
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
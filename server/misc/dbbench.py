@@ -0,0 +1,78 @@
+"""Mixed read/write throughput of garage.db from two processes, like web.py and bot.py.
+
+Usage (from server/): python -m misc.dbbench [seconds] [write_ratio]
+
+Runs each process against a scratch database twice: with a plain
+create_engine() (the old setup) and with misc.dbconfig.make_engine().
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import multiprocessing
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+def _worker(url: str, tuned: bool, seconds: float, write_ratio: float, results):
+    from misc.db import Log
+    from misc.dbconfig import make_engine
+
+    engine = make_engine(url) if tuned else create_engine(url)
+    Session = sessionmaker(bind=engine)
+    reads = writes = locked = 0
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        with Session() as db:
+            try:
+                if random.random() < write_ratio:
+                    db.add(Log(garage_id=1, user="bench", action="left", timestamp=int(time.time())))
+                    db.commit()
+                    writes += 1
+                else:
+                    db.query(Log).filter_by(garage_id=1).order_by(Log.timestamp.desc()).limit(50).all()
+                    reads += 1
+            except OperationalError:
+                db.rollback()
+                locked += 1
+    engine.dispose()
+    results.put((reads, writes, locked))
+
+def run(tuned: bool, seconds: float, write_ratio: float, processes: int = 2):
+    from misc.dbconfig import make_engine
+    from misc.migrations import migrate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # journal_mode=WAL is stored in the file, so each run gets its own
+        engine = make_engine(url) if tuned else create_engine(url)
+        migrate(engine)
+        engine.dispose()
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_worker, args=(url, tuned, seconds, write_ratio, results))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        totals = [0, 0, 0]
+        for _ in workers:
+            for i, value in enumerate(results.get()):
+                totals[i] += value
+        for worker in workers:
+            worker.join()
+
+    reads, writes, locked = totals
+    label = "tuned  " if tuned else "default"
+    print(
+        f"{label}: {(reads + writes) / seconds:8.0f} ops/s "
+        f"({reads / seconds:.0f} reads/s, {writes / seconds:.0f} writes/s, {locked} 'database is locked')"
+    )
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    write_ratio = float(sys.argv[2]) if len(sys.argv) > 2 else 0.2
+    for tuned in (False, True):
+        run(tuned, seconds, write_ratio)
@@ -0,0 +1,34 @@
+import os
+import hmac
+import hashlib
+from typing import Optional
+
+DEFAULT_DEVICE_ID = "default"
+
+# Per-device secrets are derived from this key, so server.py can check a
+# device without a database lookup: token = HMAC-SHA256(DEVICE_SECRET, device_id)
+DEVICE_SECRET = os.getenv("DEVICE_SECRET")
+
+def device_token(device_id: str) -> str:
+    if not DEVICE_SECRET:
+        raise RuntimeError("DEVICE_SECRET is not set")
+    return hmac.new(DEVICE_SECRET.encode(), device_id.encode(), hashlib.sha256).hexdigest()
+
+# The ESP32 firmware already in the field (esp-idf/main/smart-garage.c)
+# connects to plain /ws without a token. Set LEGACY_DEVICE_AUTH=0 once the
+# default device has been reflashed to send one.
+LEGACY_DEVICE_AUTH = os.getenv("LEGACY_DEVICE_AUTH", "1") == "1"
+
+def verify_device_token(device_id: str, token: Optional[str], legacy_route: bool = False) -> bool:
+    if not DEVICE_SECRET:
+        # Single-garage setups from before device secrets: only the default device, unauthenticated
+        return device_id == DEFAULT_DEVICE_ID
+    if legacy_route and LEGACY_DEVICE_AUTH and not token:
+        return device_id == DEFAULT_DEVICE_ID
+    return bool(token) and hmac.compare_digest(device_token(device_id), token)
+
+# Shared with bot.py, which subscribes to /api/garage/events
+EVENTS_TOKEN = os.getenv("EVENTS_TOKEN")
+
+def verify_events_token(token: Optional[str]) -> bool:
+    return bool(EVENTS_TOKEN) and bool(token) and hmac.compare_digest(EVENTS_TOKEN, token)
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class EventBus:
+    """In-process fan-out of events to subscriber queues.
+
+    A slow subscriber never blocks the publisher: when its queue is full
+    the oldest event is dropped.
+    """
+
+    def __init__(self, maxsize: int = 100):
+        self.maxsize = maxsize
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.maxsize)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event: dict):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                logger.warning("Event subscriber lagging, dropped oldest event")
+            queue.put_nowait(event)
+
+class StateTracker:
+    """Turns periodic status frames into state-transition events."""
+
+    def __init__(self, bus: EventBus):
+        self.bus = bus
+        self._states: Dict[str, str] = {}
+
+    def seed(self, device_id: str, state: str):
+        """Sets the known state without publishing, e.g. from a snapshot taken before a restart."""
+        self._states[device_id] = state
+
+    def update(self, device_id: str, status: dict, timestamp: float):
+        state = status.get("state")
+        previous = self._states.get(device_id)
+        if state is None or state == previous:
+            return
+        self._states[device_id] = state
+        if previous is None:
+            # First frame ever seen for a device (nothing seeded from a snapshot) is
+            # not a transition. States survive reconnects, so a change that
+            # happened while the device was offline is still reported.
+            return
+        self.bus.publish({
+            "type": "state_changed",
+            "device_id": device_id,
+            "state": state,
+            "previous": previous,
+            "timestamp": timestamp,
+        })
+
+class Debouncer:
+    """Collapses bursts of per-key values into one delivery.
+
+    Every value for a key restarts its timer (trailing debounce): delivery
+    happens once a key has been quiet for `delay` seconds, or for
+    `hold[value]` seconds if that is longer. Only the last value is passed
+    to `deliver`, and only if it differs from what was delivered before.
+
+    Holding transient values (e.g. "moving" for longer than a full door
+    move) lets the final state of the move replace them before they go out.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[str, str], Awaitable[None]],
+        delay: float,
+        hold: Optional[Dict[str, float]] = None
+    ):
+        self.deliver = deliver
+        self.delay = delay
+        self.hold = hold or {}
+        self._pending: Dict[str, str] = {}
+        self._delivered: Dict[str, str] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def push(self, key: str, value: str, previous: Optional[str] = None):
+        if previous is not None:
+            # Baseline for a burst that ends where it started, e.g. open -> moving -> open
+            self._delivered.setdefault(key, previous)
+        self._pending[key] = value
+        task = self._tasks.pop(key, None)
+        if task:
+            task.cancel()
+        delay = max(self.delay, self.hold.get(value, 0))
+        self._tasks[key] = asyncio.create_task(self._flush(key, delay))
+
+    async def _flush(self, key: str, delay: float):
+        # Cancelled by a newer push, which has already replaced this task
+        await asyncio.sleep(delay)
+        del self._tasks[key]
+        value = self._pending.pop(key)
+        if self._delivered.get(key) == value:
+            return
+        self._delivered[key] = value
+        try:
+            await self.deliver(key, value)
+        except Exception as e:
+            logger.error("Delivery for %s failed: %s", key, e)
+
+    def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._pending.clear()
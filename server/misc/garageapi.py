@@ -1,23 +1,23 @@
 import os
 import logging
-import aiohttp
+import asyncio
 from datetime import datetime
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any
 from sqlalchemy.orm import Session
+from .logs import get_correlation_id, CORRELATION_HEADER
+from .devices import DEFAULT_DEVICE_ID, EVENTS_TOKEN
 
-# Setup logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Get base URL from environment variable with fallback
 BASE_API_URL = os.getenv('GARAGE_API_URL')
 
+# aiohttp is imported inside the methods: it is the heaviest import of both
+# web.py and bot.py and is only needed once a request is actually made
+
 class GarageAPI:
     @staticmethod
-    async def open(thing: str, db: Session, user_id: int) -> str:
+    async def open(thing: str, db: Session, user_id: int, device_id: str = DEFAULT_DEVICE_ID) -> str:
         # Map the commands to API endpoints
         command_map = {
             'left': 'open',
@@ -29,11 +29,13 @@ class GarageAPI:
             
         command = command_map[thing]
         
+        import aiohttp
         try:
             async with aiohttp.ClientSession() as session:
                 async with session.post(
                     f'{BASE_API_URL}/api/garage/command',
-                    params={'command': command},
+                    params={'command': command, 'device_id': device_id},
+                    headers={CORRELATION_HEADER: get_correlation_id()},
                     timeout=aiohttp.ClientTimeout(total=5)
                 ) as response:
                     response.raise_for_status()
@@ -45,20 +47,50 @@ class GarageAPI:
         except Exception as e:
             # Still log failed attempts
             
-            logger.error(f"API error: {str(e)}")
+            logger.error("API error: %s", e)
             return f"Error: {str(e)}"
 
     @staticmethod
-    async def get_status() -> Dict[str, Any]:
+    async def get_status(device_id: str = DEFAULT_DEVICE_ID) -> Dict[str, Any]:
+        import aiohttp
         try:
             async with aiohttp.ClientSession() as session:
                 async with session.get(
                     f'{BASE_API_URL}/api/garage/status',
+                    params={'device_id': device_id},
+                    headers={CORRELATION_HEADER: get_correlation_id()},
                     timeout=aiohttp.ClientTimeout(total=5)
                 ) as response:
                     response.raise_for_status()
                     return await response.json()
                     
         except Exception as e:
-            logger.error(f"Failed to get status: {str(e)}")
-            return {"error": str(e)}
\ No newline at end of file
+            logger.error("Failed to get status: %s", e)
+            return {"error": str(e)}
+
+    @staticmethod
+    async def events() -> AsyncIterator[Dict[str, Any]]:
+        """Yields state-transition events from the server, reconnecting with backoff."""
+        import aiohttp
+        delay = 1
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(
+                        f'{BASE_API_URL}/api/garage/events',
+                        headers={'Authorization': f'Bearer {EVENTS_TOKEN}'},
+                        heartbeat=30
+                    ) as ws:
+                        logger.info("Subscribed to garage events")
+                        delay = 1
+                        async for message in ws:
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                yield message.json()
+                            elif message.type == aiohttp.WSMsgType.ERROR:
+                                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Event stream error: %s", e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
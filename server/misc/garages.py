@@ -0,0 +1,59 @@
+"""Garage provisioning.
+
+Usage (from server/):
+    python -m misc.garages add --name "Box 12" --lat 55.75 --lon 37.62 [--device-id box12]
+    python -m misc.garages list
+
+`add` prints the device's websocket path with its token (requires
+DEVICE_SECRET), the bot link users follow to join the garage and the
+first temporary password.
+"""
+import argparse
+import uuid
+from dotenv import load_dotenv
+
+def create_garage(db, name: str, latitude: float, longitude: float, device_id: str = None):
+    from .db import Garage
+    garage = Garage(
+        name=name,
+        device_id=device_id or uuid.uuid4().hex[:12],
+        latitude=latitude,
+        longitude=longitude
+    )
+    db.add(garage)
+    db.commit()
+    return garage
+
+def main():
+    load_dotenv()
+    from .db import get_db, init_db, Garage
+    from .config_manager import ConfigManager
+    from .devices import device_token, DEVICE_SECRET
+
+    parser = argparse.ArgumentParser(prog="python -m misc.garages")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="create a garage")
+    add.add_argument("--name", required=True)
+    add.add_argument("--lat", type=float, required=True)
+    add.add_argument("--lon", type=float, required=True)
+    add.add_argument("--device-id")
+    commands.add_parser("list", help="list garages")
+    args = parser.parse_args()
+    if args.command == "add" and not DEVICE_SECRET:
+        # Checked before anything is written, so a failed run leaves no garage behind
+        parser.error("DEVICE_SECRET must be set to issue a device token")
+
+    init_db()
+    db = next(get_db())
+    if args.command == "add":
+        garage = create_garage(db, args.name, args.lat, args.lon, args.device_id)
+        print(f"Garage #{garage.id} ({garage.name})")
+        print(f"Device: /ws/{garage.device_id}?token={device_token(garage.device_id)}")
+        print(f"Bot link: https://t.me/new_garage_opener_Bot?start={garage.id}")
+        print(f"Password: {ConfigManager.get_temp_password(db, garage.id)}")
+    else:
+        for garage in db.query(Garage).order_by(Garage.id):
+            print(f"#{garage.id}\t{garage.device_id}\t{garage.name}\t{garage.latitude},{garage.longitude}\towner={garage.owner_id}")
+
+if __name__ == "__main__":
+    main()
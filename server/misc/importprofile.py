@@ -0,0 +1,54 @@
+"""Import-time profile of a service entry point.
+
+Usage (from server/): python -m misc.importprofile web bot server
+"""
+import subprocess
+import sys
+from typing import List, Tuple
+
+def profile(module: str) -> List[Tuple[int, int, str]]:
+    """Imports module in a fresh interpreter with -X importtime; returns (self_us, cumulative_us, name)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+def _depth(name: str) -> int:
+    return (len(name) - len(name.lstrip()) - 1) // 2
+
+def report(module: str, top: int = 15):
+    rows = profile(module)
+    if not rows:
+        print(f"{module}: import failed")
+        return
+    # The entry module isn't necessarily the last row: modules imported at
+    # interpreter shutdown (e.g. gc) may follow it
+    entry = next((i for i in range(len(rows) - 1, -1, -1) if rows[i][2].strip() == module), None)
+    if entry is None:
+        print(f"{module}: not found in import profile")
+        return
+    total = rows[entry][1]
+    print(f"{module}: {total / 1000:.1f} ms total")
+    # Children are listed before their parent, nested two spaces per level;
+    # walk back from the entry module to collect what it imports directly
+    direct = []
+    for row in reversed(rows[:entry]):
+        depth = _depth(row[2])
+        if depth == 0:
+            break
+        if depth == 1:
+            direct.append(row)
+    for self_us, cumulative_us, name in sorted(direct, key=lambda r: r[1], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name.strip()}")
+
+if __name__ == "__main__":
+    for module in sys.argv[1:] or ["web", "bot", "server"]:
+        report(module)
@@ -0,0 +1,67 @@
+"""Time a logging call costs the calling (event loop) thread.
+
+Usage (from server/): python -m misc.logbench [records]
+
+Compares uvicorn's default access-log setup (a StreamHandler writing on
+the caller's thread) with misc.logs.setup_logging(), both writing to a file.
+"""
+import sys
+import time
+import logging
+import tempfile
+
+def _measure(logger: logging.Logger, records: int):
+    timings = []
+    for i in range(records):
+        start = time.perf_counter()
+        logger.info('%s - "%s %s HTTP/%s" %d', "127.0.0.1:50000", "GET", "/api/garage/status", "1.1", 200)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return sum(timings) / records, timings[int(records * 0.99)], timings[-1]
+
+def _report(name: str, result):
+    mean, p99, worst = result
+    print(f"{name:8} mean {mean * 1e6:6.1f} us  p99 {p99 * 1e6:6.1f} us  max {worst * 1e6:8.1f} us")
+
+class SlowSink:
+    """A stream whose writes block like a full pipe or a busy container log driver."""
+
+    def __init__(self, stream, delay: float):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text: str):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def run(sink, records: int):
+    from misc.logs import setup_logging, shutdown_logging
+
+    access = logging.getLogger("uvicorn.access")
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter("%(levelname)s:     %(message)s"))
+    access.addHandler(handler)
+    access.propagate = False
+    access.setLevel(logging.INFO)
+    _report("sync", _measure(access, records))
+
+    stderr, sys.stderr = sys.stderr, sink
+    try:
+        setup_logging(level="INFO", json_output=True)
+        _report("queued", _measure(access, records))
+        shutdown_logging()
+    finally:
+        sys.stderr = stderr
+
+def main(records: int):
+    with tempfile.TemporaryFile("w") as f:
+        print("file:")
+        run(f, records)
+        print("file behind 100 us blocking writes:")
+        run(SlowSink(f, 0.0001), records)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,183 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+# Correlation ID of the HTTP request / bot update currently being handled
+correlation_id: ContextVar[str] = ContextVar("correlation_id", default="-")
+
+CORRELATION_HEADER = "X-Request-ID"
+
+UVICORN_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def new_correlation_id(value: Optional[str] = None) -> str:
+    cid = value or uuid.uuid4().hex[:16]
+    correlation_id.set(cid)
+    return cid
+
+
+def get_correlation_id() -> str:
+    return correlation_id.get()
+
+
+async def correlation_middleware(request, call_next):
+    """HTTP middleware for web.py and server.py: binds the caller's X-Request-ID
+    (or a new one) for the request and echoes it in the response."""
+    cid = new_correlation_id(request.headers.get(CORRELATION_HEADER))
+    response = await call_next(request)
+    response.headers[CORRELATION_HEADER] = cid
+    return response
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamps each record with the correlation ID of the current context.
+
+    Runs on the event loop thread (before the record is queued), because the
+    writer thread does not share the caller's context.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Lets through one record out of every `every` (warnings and up always pass)."""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        self._count += 1
+        return (self._count - 1) % self.every == 0
+
+
+class RateLimitFilter(logging.Filter):
+    """Token bucket: at most `rate` records per `per` seconds (warnings and up always pass)."""
+
+    def __init__(self, rate: float, per: float = 1.0):
+        super().__init__()
+        self.rate = rate
+        self.per = per
+        self._tokens = rate
+        self._last = time.monotonic()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        self._tokens = min(self.rate, self._tokens + (now - self._last) * self.rate / self.per)
+        self._last = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "cid": getattr(record, "correlation_id", "-"),
+        }
+        extra = getattr(record, "data", None)
+        if extra:
+            entry["data"] = extra
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Keep msg/args unformatted; the writer thread renders them.
+        # Exceptions are rendered here, since tracebacks can't cross threads safely.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: Optional[str] = None, json_output: Optional[bool] = None) -> None:
+    """Routes the root logger through a queue drained by a background writer thread.
+
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        level = level or os.getenv("LOG_LEVEL", "INFO")
+        if json_output is None:
+            json_output = os.getenv("LOG_FORMAT", "json") == "json"
+
+        stream_handler = logging.StreamHandler()
+        if json_output:
+            stream_handler.setFormatter(JsonFormatter())
+        else:
+            stream_handler.setFormatter(logging.Formatter(
+                '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+            ))
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(CorrelationFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        # uvicorn installs its own synchronous StreamHandlers with propagate=False;
+        # send its records (including the per-request access log) through the queue too.
+        # Entry points that call uvicorn.run() pass log_config=None so uvicorn doesn't
+        # reinstall them afterwards.
+        for name in UVICORN_LOGGERS:
+            uvicorn_logger = logging.getLogger(name)
+            for handler in list(uvicorn_logger.handlers):
+                uvicorn_logger.removeHandler(handler)
+            uvicorn_logger.propagate = True
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str, sample_every: int = 0, rate: float = 0, per: float = 1.0) -> logging.Logger:
+    """Returns a logger, optionally with sampling and/or rate limiting for high-volume events."""
+    logger = logging.getLogger(name)
+    if sample_every and not any(isinstance(f, SampleFilter) for f in logger.filters):
+        logger.addFilter(SampleFilter(sample_every))
+    if rate and not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(rate, per))
+    return logger
@@ -0,0 +1,170 @@
+"""Versioned schema migrations, applied once per process by misc.db.init_db().
+
+Each migration runs at most once per database; applied versions are recorded
+in schema_version. Migrations are written against plain tables, not the ORM
+models, so they keep describing the schema as it was at that version.
+"""
+import logging
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, Integer, Boolean, String, Text, DateTime, Float, ForeignKey, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from .devices import DEFAULT_DEVICE_ID
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+# Arbitrary application-wide key for pg_advisory_xact_lock
+MIGRATION_LOCK_KEY = 7041985
+
+def migration(version: int, description: str):
+    def register(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return upgrade
+    return register
+
+@migration(1, "initial schema")
+def _initial_schema(conn: Connection):
+    metadata = MetaData()
+    Table(
+        'users', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('is_auth', Boolean),
+        Column('current_itern', String),
+        Column('created_at', DateTime),
+        Column('is_owner', Boolean),
+    )
+    Table(
+        'system_config', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('key', String, unique=True),
+        Column('value', Text),
+        Column('updated_at', DateTime),
+    )
+    Table(
+        'logs', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('user', String),
+        Column('action', String),
+        Column('timestamp', Integer),
+    )
+    # Databases created before versioning already have these tables
+    metadata.create_all(conn, checkfirst=True)
+
+@migration(2, "garages, per-garage credentials, garage_id on users and logs")
+def _garages(conn: Connection):
+    metadata = MetaData()
+    garages = Table(
+        'garages', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('name', String),
+        Column('device_id', String, unique=True, index=True),
+        Column('latitude', Float),
+        Column('longitude', Float),
+        Column('owner_id', Integer),
+        Column('created_at', DateTime),
+    )
+    credentials = Table(
+        'garage_credentials', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('garage_id', Integer, ForeignKey('garages.id'), unique=True, index=True),
+        Column('temp_password', String),
+        Column('updated_at', DateTime),
+    )
+    metadata.create_all(conn, checkfirst=True)
+
+    # Existing rows are moved to the default garage (misc.db.DEFAULT_GARAGE_ID),
+    # so it has to exist before anything references it. Its location is filled
+    # in from GARAGE_LOCATION by misc.db.init_db().
+    if conn.execute(garages.select().where(garages.c.id == 1)).first() is None:
+        conn.execute(garages.insert().values(
+            id=1,
+            name='default',
+            device_id=DEFAULT_DEVICE_ID,
+            created_at=datetime.utcnow()
+        ))
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT setval(pg_get_serial_sequence('garages', 'id'), (SELECT MAX(id) FROM garages))"))
+
+    inspector = inspect(conn)
+    for table in ('users', 'logs'):
+        columns = {c['name'] for c in inspector.get_columns(table)}
+        if 'garage_id' not in columns:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN garage_id INTEGER DEFAULT 1 REFERENCES garages(id)"))
+
+    indexes = {
+        'ix_users_garage_id': "CREATE INDEX ix_users_garage_id ON users (garage_id)",
+        'ix_logs_garage_timestamp': "CREATE INDEX ix_logs_garage_timestamp ON logs (garage_id, timestamp)",
+    }
+    existing = {i['name'] for table in ('users', 'logs') for i in inspector.get_indexes(table)}
+    for name, ddl in indexes.items():
+        if name not in existing:
+            conn.execute(text(ddl))
+
+    # The single-garage password lived in system_config; keep it valid
+    legacy_password = conn.execute(
+        text("SELECT value FROM system_config WHERE key = 'temp_password'")
+    ).scalar()
+    has_credential = conn.execute(
+        credentials.select().where(credentials.c.garage_id == 1)
+    ).first() is not None
+    if legacy_password and not has_credential:
+        conn.execute(credentials.insert().values(
+            garage_id=1,
+            temp_password=legacy_password,
+            updated_at=datetime.utcnow()
+        ))
+
+    # Ownership lived on users.is_owner; a bot purchase leaves a single owner
+    conn.execute(
+        text(
+            "UPDATE garages SET owner_id = ("
+            "SELECT id FROM users WHERE is_owner = :owner ORDER BY created_at DESC LIMIT 1"
+            ") WHERE id = 1 AND owner_id IS NULL"
+        ),
+        {"owner": True}
+    )
+
+def _version_table(metadata: MetaData) -> Table:
+    return Table(
+        'schema_version', metadata,
+        Column('version', Integer, primary_key=True),
+        Column('description', String),
+        Column('applied_at', DateTime),
+    )
+
+def current_version(conn: Connection) -> int:
+    if not inspect(conn).has_table('schema_version'):
+        return 0
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def migrate(engine: Engine) -> int:
+    """Applies pending migrations in one transaction; returns the resulting version."""
+    with engine.connect() as conn:
+        # Take a lock up front so web.py and bot.py starting together
+        # don't both see the same pending migrations
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        elif conn.dialect.name == "postgresql":
+            # Released when the transaction commits; works before schema_version exists
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+        version_table = _version_table(MetaData())
+        version_table.create(conn, checkfirst=True)
+        version = current_version(conn)
+
+        for target, description, upgrade in MIGRATIONS:
+            if target <= version:
+                continue
+            logger.info("Applying migration %d: %s", target, description)
+            upgrade(conn)
+            conn.execute(version_table.insert().values(
+                version=target,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+            version = target
+
+        conn.commit()
+    return version
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, constr
 from typing import Annotated
+from .db import DEFAULT_GARAGE_ID
 
 class LocationData(BaseModel):
     latitude: float
@@ -7,8 +8,10 @@ class LocationData(BaseModel):
 
 class LoginData(BaseModel):
     password: str
+    garage_id: int = DEFAULT_GARAGE_ID
 
 ConstrainedCardNumber = Annotated[str, {"pattern": r"^\d{16}$"}]
 
 class PurchaseData(BaseModel):
-    card_number: ConstrainedCardNumber
\ No newline at end of file
+    card_number: ConstrainedCardNumber
+    garage_id: int = DEFAULT_GARAGE_ID
\ No newline at end of file
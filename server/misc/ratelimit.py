@@ -0,0 +1,243 @@
+import os
+import time
+import sqlite3
+import logging
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+RATELIMIT_DB = os.getenv("RATELIMIT_DB", "ratelimit.db")
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+
+class RateLimiter:
+    """In-memory token buckets keyed by string, bounded by LRU eviction."""
+
+    def __init__(self, rate: float, per: float = 1.0, burst: Optional[float] = None, max_keys: int = 10000):
+        self.rate = rate / per
+        self.burst = burst if burst is not None else rate
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def allow(self, key: str, now: Optional[float] = None) -> float:
+        """Takes a token for key. Returns 0 if allowed, else seconds until the next token."""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0
+        return (1 - bucket.tokens) / self.rate
+
+class LoginGuard:
+    """Brute-force protection for the temp_password login paths.
+
+    check_local() uses in-process state only: per-key token buckets (IP for
+    web.py, Telegram user for bot.py; each key only reaches one process)
+    and a short-lived cache of lockouts and exhausted shared buckets.
+    Rejections it makes cost no I/O.
+
+    check_shared() consults a small SQLite file shared by web.py and bot.py:
+    lockouts with progressive backoff per key, a failure budget per garage
+    and the global attempt budget. Both budgets are token buckets, so they
+    refill on their own and can't be used to lock a garage out for long.
+    Rejections are decided on a read; only a granted token is written.
+    """
+
+    def __init__(
+        self,
+        path: str = RATELIMIT_DB,
+        rate: float = float(os.getenv("LOGIN_RATE", "5")),
+        per: float = 60.0,
+        global_rate: float = float(os.getenv("LOGIN_GLOBAL_RATE", "20")),
+        garage_rate: float = float(os.getenv("LOGIN_GARAGE_RATE", "10")),
+        garage_per: float = 60.0,
+        max_failures: int = 3,
+        base_lockout: float = 30.0,
+        max_lockout: float = 3600.0,
+        max_keys: int = 10000
+    ):
+        self.path = path
+        self.global_rate = global_rate
+        self.garage_rate = garage_rate / garage_per
+        self.garage_burst = garage_rate
+        self.max_failures = max_failures
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.max_keys = max_keys
+        self._per_key = RateLimiter(rate, per, max_keys=max_keys)
+        # Only used while the shared store is unavailable
+        self._global = RateLimiter(global_rate, 1.0, max_keys=16)
+        # Key -> time until which it is known to be rejected
+        self._blocked: "OrderedDict[str, float]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._writes = 0
+
+    def _store(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None:
+            try:
+                # A short timeout: a busy store falls back to in-memory limits
+                # rather than stalling the event loop
+                conn = sqlite3.connect(self.path, timeout=0.1, isolation_level=None, check_same_thread=False)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS lockouts ("
+                    "key TEXT PRIMARY KEY, failures INTEGER NOT NULL, until REAL NOT NULL, updated REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS buckets ("
+                    "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+                )
+                self._conn = conn
+            except sqlite3.Error as e:
+                logger.error("Rate limit store unavailable: %s", e)
+        return self._conn
+
+    @staticmethod
+    def _garage_key(garage_id: Optional[int]) -> Optional[str]:
+        return None if garage_id is None else f"garage:{garage_id}"
+
+    def _block(self, key: str, until: float):
+        self._blocked[key] = until
+        self._blocked.move_to_end(key)
+        if len(self._blocked) > self.max_keys:
+            self._blocked.popitem(last=False)
+
+    def _blocked_for(self, key: str, now: float) -> float:
+        until = self._blocked.get(key)
+        if until is None:
+            return 0
+        if until > now:
+            return until - now
+        del self._blocked[key]
+        return 0
+
+    @staticmethod
+    def _tokens(store: sqlite3.Connection, key: str, rate: float, burst: float, now: float) -> float:
+        row = store.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+        return burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+
+    def _shared_bucket(self, store: sqlite3.Connection, key: str, rate: float, burst: float, now: float, take: bool) -> float:
+        """Returns 0 if key's shared bucket has a token (taking it if take), else seconds until it will."""
+        tokens = self._tokens(store, key, rate, burst, now)
+        if tokens >= 1 and take:
+            store.execute("BEGIN IMMEDIATE")
+            try:
+                # Re-read under the write lock; the other process may have taken it
+                tokens = self._tokens(store, key, rate, burst, now)
+                if tokens >= 1:
+                    store.execute(
+                        "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                        (key, tokens - 1, now)
+                    )
+                store.execute("COMMIT")
+            except BaseException:
+                store.execute("ROLLBACK")
+                raise
+        if tokens >= 1:
+            return 0
+        wait = (1 - tokens) / rate
+        self._block(key, now + wait)
+        return wait
+
+    def check_local(self, key: str, garage_id: Optional[int] = None) -> float:
+        """In-memory part of check(): returns 0 if key may go on to check_shared(), else seconds to wait."""
+        now = time.time()
+        for k in (key, self._garage_key(garage_id), "global"):
+            wait = k and self._blocked_for(k, now)
+            if wait:
+                return wait
+        return self._per_key.allow(key)
+
+    def check_shared(self, key: str, garage_id: Optional[int] = None) -> float:
+        """Shared part of check(): lockouts, the garage's failure budget and the global budget."""
+        now = time.time()
+        store = self._store()
+        if store is None:
+            return self._global.allow("global")
+        try:
+            # Lockouts set by the other process
+            row = store.execute("SELECT until FROM lockouts WHERE key = ?", (key,)).fetchone()
+            if row and row[0] > now:
+                self._block(key, row[0])
+                return row[0] - now
+            garage_key = self._garage_key(garage_id)
+            if garage_key:
+                wait = self._shared_bucket(store, garage_key, self.garage_rate, self.garage_burst, now, take=False)
+                if wait:
+                    return wait
+            return self._shared_bucket(store, "global", self.global_rate, self.global_rate, now, take=True)
+        except sqlite3.Error as e:
+            logger.error("Rate limit store read failed: %s", e)
+            return self._global.allow("global")
+
+    def check(self, key: str, garage_id: Optional[int] = None) -> float:
+        """Returns 0 if an attempt from key on garage_id may proceed, else seconds to wait."""
+        return self.check_local(key, garage_id) or self.check_shared(key, garage_id)
+
+    def lockout(self, failures: int) -> float:
+        """Lockout after the given number of consecutive failures of one key."""
+        if failures < self.max_failures:
+            return 0
+        return min(self.max_lockout, self.base_lockout * 2 ** (failures - self.max_failures))
+
+    def failure(self, key: str, garage_id: Optional[int] = None):
+        """Records a wrong password: locks key out for exponentially longer
+        periods and spends a token of the garage's failure budget."""
+        store = self._store()
+        if store is None:
+            return
+        now = time.time()
+        try:
+            store.execute(
+                "INSERT INTO lockouts (key, failures, until, updated) VALUES (?, 1, 0, ?) "
+                "ON CONFLICT(key) DO UPDATE SET failures = failures + 1, updated = excluded.updated",
+                (key, now)
+            )
+            failures = store.execute("SELECT failures FROM lockouts WHERE key = ?", (key,)).fetchone()[0]
+            lockout = self.lockout(failures)
+            if lockout:
+                store.execute("UPDATE lockouts SET until = ? WHERE key = ?", (now + lockout, key))
+                self._block(key, now + lockout)
+
+            garage_key = self._garage_key(garage_id)
+            if garage_key:
+                self._shared_bucket(store, garage_key, self.garage_rate, self.garage_burst, now, take=True)
+
+            self._writes += 1
+            if self._writes % 100 == 0:
+                # Forget keys that have been quiet for longer than the longest lockout
+                store.execute(
+                    "DELETE FROM lockouts WHERE until < ? AND updated < ?",
+                    (now, now - self.max_lockout)
+                )
+        except sqlite3.Error as e:
+            logger.error("Rate limit store write failed: %s", e)
+
+    def success(self, key: str):
+        self._blocked.pop(key, None)
+        store = self._store()
+        if store is None:
+            return
+        try:
+            store.execute("DELETE FROM lockouts WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error("Rate limit store write failed: %s", e)
+
+login_guard = LoginGuard()
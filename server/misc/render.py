@@ -0,0 +1,200 @@
+"""Reply rendering for the Telegram bot.
+
+Keyboards are built once at import (PTB telegram objects are immutable and
+safe to share), message templates are bound once per locale, and the /logs
+page is cached per garage until a new Log row is written.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import bindparam, select
+from telegram import ReplyKeyboardMarkup, KeyboardButton
+from .db import Log
+
+DEFAULT_LOCALE = "ru"
+
+MAIN_KEYBOARD = ReplyKeyboardMarkup([
+    [KeyboardButton("Пароль")],
+    [KeyboardButton("Открыть"), KeyboardButton("Закрыть")],
+    [KeyboardButton("Статус")]
+], resize_keyboard=True)
+
+START_KEYBOARD = ReplyKeyboardMarkup([
+    [KeyboardButton("Купить гараж")],
+    [KeyboardButton("Ввести пароль")]
+], resize_keyboard=True)
+
+START_KEYBOARD_SOLD = ReplyKeyboardMarkup([
+    [KeyboardButton("Ввести пароль")]
+], resize_keyboard=True)
+
+LOCATION_KEYBOARD = ReplyKeyboardMarkup(
+    [[KeyboardButton("Переключить", request_location=True)]],
+    resize_keyboard=True, one_time_keyboard=True
+)
+
+EMPTY_KEYBOARD = ReplyKeyboardMarkup([])
+
+def get_start_keyboard(is_available: bool = True) -> ReplyKeyboardMarkup:
+    return START_KEYBOARD if is_available else START_KEYBOARD_SOLD
+
+def get_main_keyboard() -> ReplyKeyboardMarkup:
+    return MAIN_KEYBOARD
+
+def get_location_keyboard() -> ReplyKeyboardMarkup:
+    return LOCATION_KEYBOARD
+
+_TEMPLATES = {
+    "ru": {
+        "welcome": (
+            "🏠 Гараж-бот\n\n"
+            "🔑 Авторизуйтесь с помощью пароля\n"
+            "🏷 Гараж доступен к покупке за {price} &$%&\n"
+        ),
+        "buy_prompt": (
+            "💳 Для покупки гаража введите номер карты (16 цифр).\n"
+            "💰 Стоимость: {price} руб."
+        ),
+        "garage_switched": "🏠 Текущий гараж: #{garage_id}",
+        "control_panel": "Добро пожаловать в панель управления!",
+        "enter_password": "Введите пароль:",
+        "access_granted": "Доступ разрешен",
+        "wrong_password": "❌ Неверный пароль",
+        "too_many_attempts": "⏳ Слишком много попыток, попробуйте позже",
+        "press_button": "Нажмите кнопку для действия",
+        "too_far": "Вы слишком далеко от гаража",
+        "done": "Выполнено",
+        "logged_out": "Выход выполнен",
+        "garage_status_error": "Ошибка получения статуса гаража",
+        "card_format_error": "❌ Неверный формат карты",
+        "purchase_done": "🎉 Поздравляем с покупкой гаража!\nТеперь вы владелец.",
+        "purchase_error": "❌ Произошла ошибка при обработке покупки.",
+        "password": "Пароль: {password}\nhttps://t.me/new_garage_opener_Bot?start={garage_id}",
+        "status": "🌡 Температура: {temperature}°C\n💧 Влажность: {humidity}%\n🚪 Состояние: {state}",
+        "stale_status": "⚠️ Последнее известное состояние на {time}, устройство еще не выходило на связь",
+        "status_error": "Ошибка получения статуса: {error}",
+        "payment_error": "❌ Ошибка при оплате: {error}",
+        "state_notification": "🔔 Гараж: {state}",
+        "log_line": "{time}: User {user} - {action}",
+        "logs": "Последние действия:\n{lines}",
+        "state_open": "Открыто",
+        "state_closed": "Закрыто",
+        "state_moving": "Движется",
+        "not_available": "N/A",
+    },
+}
+
+# str.format bound once per template; rendering is a single call
+TEMPLATES: Dict[str, Dict[str, Any]] = {
+    locale: {key: template.format for key, template in templates.items()}
+    for locale, templates in _TEMPLATES.items()
+}
+
+def render(key: str, locale: str = DEFAULT_LOCALE, **values) -> str:
+    templates = TEMPLATES.get(locale) or TEMPLATES[DEFAULT_LOCALE]
+    return templates[key](**values)
+
+# Static strings rendered once per locale
+_STATES = {
+    locale: {state: templates[f"state_{state}"]() for state in ("open", "closed", "moving")}
+    for locale, templates in TEMPLATES.items()
+}
+_NOT_AVAILABLE = {locale: templates["not_available"]() for locale, templates in TEMPLATES.items()}
+
+def _number(value, not_available: str) -> str:
+    if isinstance(value, (int, float)):
+        return f"{value:.1f}"
+    return not_available
+
+# The device reports the same few readings over and over
+_status_cache: Dict[tuple, str] = {}
+
+def render_status(status: dict, locale: str = DEFAULT_LOCALE) -> str:
+    """Status text; fields the device didn't send render as N/A instead of raising.
+
+    A status server.py restored from its snapshot ("stale") is marked with
+    the time it was last reported.
+    """
+    text = _render_readings(status, locale)
+    if status.get("stale"):
+        updated_at = status.get("updated_at")
+        templates = TEMPLATES.get(locale) or TEMPLATES[DEFAULT_LOCALE]
+        text += "\n" + templates["stale_status"](
+            time=datetime.fromtimestamp(updated_at).strftime("%d.%m %H:%M")
+            if isinstance(updated_at, (int, float))
+            else _NOT_AVAILABLE.get(locale, _NOT_AVAILABLE[DEFAULT_LOCALE])
+        )
+    return text
+
+def _render_readings(status: dict, locale: str) -> str:
+    key = (locale, status.get("temperature"), status.get("humidity"), status.get("state"))
+    try:
+        return _status_cache[key]
+    except (KeyError, TypeError):
+        pass
+
+    templates = TEMPLATES.get(locale) or TEMPLATES[DEFAULT_LOCALE]
+    not_available = _NOT_AVAILABLE.get(locale, _NOT_AVAILABLE[DEFAULT_LOCALE])
+    state = key[3] if isinstance(key[3], str) else None
+    text = templates["status"](
+        temperature=_number(key[1], not_available),
+        humidity=_number(key[2], not_available),
+        state=_STATES.get(locale, _STATES[DEFAULT_LOCALE]).get(state, not_available)
+    )
+    if len(_status_cache) >= 1024:
+        _status_cache.clear()
+    try:
+        _status_cache[key] = text
+    except TypeError:
+        # Unhashable field values; render without caching
+        pass
+    return text
+
+# Newest row of a garage's log, served by ix_logs_garage_timestamp
+_HEAD_QUERY = (
+    select(Log.id)
+    .where(Log.garage_id == bindparam("garage_id"))
+    .order_by(Log.timestamp.desc(), Log.id.desc())
+    .limit(1)
+)
+
+def render_state_notification(state: str, locale: str = DEFAULT_LOCALE) -> str:
+    templates = TEMPLATES.get(locale) or TEMPLATES[DEFAULT_LOCALE]
+    states = _STATES.get(locale, _STATES[DEFAULT_LOCALE])
+    return templates["state_notification"](state=states.get(state, state))
+
+class LogPageCache:
+    """Rendered /logs pages per garage, one per locale.
+
+    A garage's pages are kept until its newest log row changes, which also
+    catches rows written by web.py. Only used from the bot's event loop.
+    """
+
+    def __init__(self, limit: int = 50):
+        self.limit = limit
+        # garage_id -> (newest log id, {locale: page})
+        self._pages: Dict[int, Tuple[Optional[int], Dict[str, str]]] = {}
+
+    def get(self, db, garage_id: int, locale: str = DEFAULT_LOCALE) -> str:
+        head = db.execute(_HEAD_QUERY, {"garage_id": garage_id}).scalar()
+        cached = self._pages.get(garage_id)
+        if cached is None or cached[0] != head:
+            cached = self._pages[garage_id] = (head, {})
+        page = cached[1].get(locale)
+        if page is not None:
+            return page
+
+        logs = (
+            db.query(Log)
+            .filter_by(garage_id=garage_id)
+            .order_by(Log.timestamp.desc(), Log.id.desc())
+            .limit(self.limit)
+            .all()
+        )
+        line = TEMPLATES.get(locale, TEMPLATES[DEFAULT_LOCALE])["log_line"]
+        page = cached[1][locale] = render("logs", locale, lines="\n".join(
+            line(time=datetime.fromtimestamp(log.timestamp), user=log.user, action=log.action)
+            for log in logs
+        ))
+        return page
+
+log_pages = LogPageCache()
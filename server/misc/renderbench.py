@@ -0,0 +1,83 @@
+"""Per-reply CPU of the bot's rendering, before and after misc.render.
+
+Usage (from server/): python -m misc.renderbench [iterations]
+"""
+import os
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+from telegram import ReplyKeyboardMarkup, KeyboardButton
+
+STATUS = {"type": "status", "temperature": 21.37, "humidity": 48.2, "state": "open"}
+
+def _legacy_keyboard():
+    return ReplyKeyboardMarkup([
+        [KeyboardButton("Пароль")],
+        [KeyboardButton("Открыть"), KeyboardButton("Закрыть")],
+        [KeyboardButton("Статус")]
+    ], resize_keyboard=True)
+
+def _legacy_status(status):
+    return (
+        f"🌡 Температура: {status.get('temperature', 'N/A'):.1f}°C\n"
+        f"💧 Влажность: {status.get('humidity', 'N/A'):.1f}%\n"
+        f"🚪 Состояние: {'Открыто' if status.get('state') == 'open' else 'Закрыто'}"
+    )
+
+def _legacy_logs(db, Log, garage_id):
+    logs = db.query(Log).filter_by(garage_id=garage_id).order_by(Log.timestamp.desc()).limit(50).all()
+    log_text = "\n".join([
+        f"{datetime.fromtimestamp(log.timestamp)}: User {log.user} - {log.action}"
+        for log in logs
+    ])
+    return f"Последние действия:\n{log_text}"
+
+def _report(name: str, legacy: float, current: float, iterations: int):
+    print(
+        f"{name:10} {legacy / iterations * 1e6:9.1f} us -> {current / iterations * 1e6:9.1f} us "
+        f"({legacy / current:.1f}x)"
+    )
+
+def main(iterations: int):
+    from sqlalchemy.orm import sessionmaker
+    from misc.dbconfig import make_engine
+    from misc.migrations import migrate
+    from misc.db import Log
+    from misc.render import get_main_keyboard, render_status, LogPageCache
+
+    _report(
+        "keyboard",
+        timeit.timeit(_legacy_keyboard, number=iterations),
+        timeit.timeit(get_main_keyboard, number=iterations),
+        iterations
+    )
+    _report(
+        "status",
+        timeit.timeit(lambda: _legacy_status(STATUS), number=iterations),
+        timeit.timeit(lambda: render_status(STATUS), number=iterations),
+        iterations
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        migrate(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            db.add_all(
+                Log(garage_id=1, user=f"user{i % 7}", action="left" if i % 2 else "right", timestamp=1700000000 + i)
+                for i in range(500)
+            )
+            db.commit()
+            cache = LogPageCache()
+            log_iterations = max(1, iterations // 10)
+            _report(
+                "/logs",
+                timeit.timeit(lambda: _legacy_logs(db, Log, 1), number=log_iterations),
+                timeit.timeit(lambda: cache.get(db, 1), number=log_iterations),
+                log_iterations
+            )
+        engine.dispose()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
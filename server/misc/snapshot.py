@@ -0,0 +1,55 @@
+import os
+import json
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "garage_state.json")
+SNAPSHOT_VERSION = 1
+
+class SnapshotStore:
+    """Last-known device state on disk, replaced atomically on every save.
+
+    A crash mid-write leaves the previous snapshot in place: the new one is
+    written to a temporary file in the same directory, fsynced and renamed
+    over the old one.
+    """
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+
+    def load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.error("Ignoring unreadable snapshot %s: %s", self.path, e)
+            return {}
+        if data.get("version") != SNAPSHOT_VERSION:
+            logger.warning("Ignoring snapshot %s with version %s", self.path, data.get("version"))
+            return {}
+        return data.get("devices", {})
+
+    def save(self, devices: dict):
+        payload = json.dumps(
+            {"version": SNAPSHOT_VERSION, "devices": devices},
+            separators=(",", ":"),
+            ensure_ascii=False
+        )
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".snapshot-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
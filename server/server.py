@@ -1,50 +1,183 @@
+from dotenv import load_dotenv
+load_dotenv()
+
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from typing import List
+from contextlib import asynccontextmanager, suppress
+from typing import Dict, List, Optional, Set
+import os
 import json
 import logging
 import asyncio
+import time
+from misc.events import EventBus, StateTracker
+from misc.snapshot import SnapshotStore
+from misc.devices import DEFAULT_DEVICE_ID, verify_device_token, verify_events_token
+from misc.logs import setup_logging, get_logger, correlation_middleware
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
+# Status frames arrive every few seconds per device; keep at most one a minute
+status_logger = get_logger(__name__ + ".status", rate=1, per=60)
+
+# How often last-known device state is written to disk, if it changed
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "5"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    restore_snapshot()
+    task = asyncio.create_task(snapshot_loop())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        await save_snapshot()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(correlation_middleware)
 
 class ConnectionManager:
+    """Connections and last status, keyed by device ID so lookups don't depend on device count."""
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.device_status: dict = {}
+        self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.device_status: Dict[str, dict] = {}
+        # Per-device registry metadata, persisted with the status
+        self.last_seen: Dict[str, float] = {}
+        self.status_updated: Dict[str, float] = {}
+        # Devices whose status came from a snapshot and hasn't been refreshed yet
+        self.stale: Set[str] = set()
+        self.dirty = False
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, device_id: str = DEFAULT_DEVICE_ID):
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info("Client connected")
+        self.active_connections.setdefault(device_id, []).append(websocket)
+        self.last_seen[device_id] = time.time()
+        self.dirty = True
+        logger.info("Client connected: %s", device_id)
+
+    def disconnect(self, websocket: WebSocket, device_id: str = DEFAULT_DEVICE_ID):
+        connections = self.active_connections.get(device_id, [])
+        if websocket in connections:
+            connections.remove(websocket)
+        if not connections:
+            self.active_connections.pop(device_id, None)
+        self.last_seen[device_id] = time.time()
+        self.dirty = True
+        logger.info("Client disconnected: %s", device_id)
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info("Client disconnected")
+    def is_connected(self, device_id: str = DEFAULT_DEVICE_ID) -> bool:
+        return bool(self.active_connections.get(device_id))
 
-    async def broadcast(self, message: str, exclude: WebSocket = None):
-        for connection in self.active_connections:
+    async def broadcast(self, message: str, device_id: str = DEFAULT_DEVICE_ID, exclude: WebSocket = None):
+        for connection in list(self.active_connections.get(device_id, [])):
             if connection != exclude:
                 try:
                     await connection.send_text(message)
                 except Exception as e:
-                    logger.error(f"Error broadcasting message: {e}")
+                    logger.error("Error broadcasting message: %s", e)
 
-    def update_status(self, status: dict):
-        self.device_status = status
+    def update_status(self, status: dict, device_id: str = DEFAULT_DEVICE_ID):
+        now = time.time()
+        self.device_status[device_id] = status
+        self.status_updated[device_id] = now
+        self.last_seen[device_id] = now
+        self.stale.discard(device_id)
+        self.dirty = True
 
-    def get_status(self) -> dict:
-        return self.device_status
+    def get_status(self, device_id: str = DEFAULT_DEVICE_ID) -> dict:
+        status = self.device_status.get(device_id, {})
+        if status and device_id in self.stale:
+            # Last known state from before a restart; the device hasn't reported since
+            return {**status, "stale": True, "updated_at": self.status_updated.get(device_id)}
+        return status
+
+    def snapshot(self) -> dict:
+        return {
+            device_id: {
+                "status": self.device_status.get(device_id),
+                "updated_at": self.status_updated.get(device_id),
+                "last_seen": last_seen,
+                "connected": self.is_connected(device_id),
+            }
+            for device_id, last_seen in self.last_seen.items()
+        }
+
+    def restore(self, devices: dict):
+        for device_id, entry in devices.items():
+            self.last_seen[device_id] = entry.get("last_seen")
+            if entry.get("status"):
+                self.device_status[device_id] = entry["status"]
+                self.status_updated[device_id] = entry.get("updated_at")
+                self.stale.add(device_id)
 
 manager = ConnectionManager()
+events = EventBus()
+state_tracker = StateTracker(events)
+snapshots = SnapshotStore()
+
+def restore_snapshot():
+    devices = snapshots.load()
+    manager.restore(devices)
+    for device_id, status in manager.device_status.items():
+        if status.get("state"):
+            # A change that happened while we were down is still reported as a transition
+            state_tracker.seed(device_id, status["state"])
+    logger.info("Restored last-known state of %d device(s)", len(devices))
+
+# Held for the whole write, so the final save on shutdown can't be
+# overtaken by an older one still running in a thread
+snapshot_lock = asyncio.Lock()
+
+def _write_snapshot(devices: dict) -> bool:
+    try:
+        snapshots.save(devices)
+        return True
+    except Exception as e:
+        logger.error("Failed to save snapshot: %s", e)
+        return False
+
+async def save_snapshot():
+    async with snapshot_lock:
+        if not manager.dirty:
+            return
+        manager.dirty = False
+        # fsync stays off the event loop. A thread can't be cancelled, so a
+        # cancelled snapshot_loop waits for its write before releasing the lock
+        write = asyncio.ensure_future(asyncio.to_thread(_write_snapshot, manager.snapshot()))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            await asyncio.wait([write])
+            raise
+        finally:
+            if not (write.done() and write.result()):
+                manager.dirty = True
+
+async def snapshot_loop():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        await save_snapshot()
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
+async def legacy_websocket_endpoint(websocket: WebSocket, token: Optional[str] = None):
+    # The default garage's device; accepted without a token unless LEGACY_DEVICE_AUTH=0
+    await device_session(websocket, DEFAULT_DEVICE_ID, verify_device_token(DEFAULT_DEVICE_ID, token, legacy_route=True))
+
+@app.websocket("/ws/{device_id}")
+async def websocket_endpoint(websocket: WebSocket, device_id: str, token: Optional[str] = None):
+    # Devices connect to /ws/<device_id>?token=<device token from `python -m misc.garages`>
+    await device_session(websocket, device_id, verify_device_token(device_id, token))
+
+async def device_session(websocket: WebSocket, device_id: str, authorized: bool):
+    if not authorized:
+        logger.warning("Rejected connection for device %s: bad token", device_id)
+        await websocket.close(code=1008)
+        return
     try:
-        await manager.connect(websocket)
+        await manager.connect(websocket, device_id)
         while True:
             data = await websocket.receive_text()
             try:
@@ -52,43 +185,68 @@ async def websocket_endpoint(websocket: WebSocket):
                 
                 # Handle status updates
                 if "type" in message and message["type"] == "status":
-                    manager.update_status(message)
-                    # Broadcast status to all clients
-                    await manager.broadcast(data, exclude=websocket)
-                    logger.info(f"Status update: {message}")
+                    manager.update_status(message, device_id)
+                    state_tracker.update(device_id, message, time.time())
+                    # Broadcast status to the other clients of this device
+                    await manager.broadcast(data, device_id, exclude=websocket)
+                    status_logger.info("Status update from %s: %s", device_id, message)
 
             except json.JSONDecodeError:
-                logger.error(f"Invalid JSON received: {data}")
+                logger.error("Invalid JSON received: %s", data)
+
+    except WebSocketDisconnect:
+        manager.disconnect(websocket, device_id)
+    except Exception as e:
+        logger.error("WebSocket error: %s", e)
+        manager.disconnect(websocket, device_id)
 
+@app.websocket("/api/garage/events")
+async def events_endpoint(websocket: WebSocket):
+    """
+    Stream of garage state transitions (open/closed/moving), one JSON object per message.
+    Requires "Authorization: Bearer <EVENTS_TOKEN>"
+    """
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not verify_events_token(token):
+        logger.warning("Rejected event subscriber: bad token")
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    queue = events.subscribe()
+    try:
+        while True:
+            event = await queue.get()
+            await websocket.send_text(json.dumps(event))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
-        manager.disconnect(websocket)
+        logger.error("Event stream error: %s", e)
+    finally:
+        events.unsubscribe(queue)
 
 @app.post("/api/garage/command")
-async def send_command(command: str):
+async def send_command(command: str, device_id: str = DEFAULT_DEVICE_ID):
     """
     Send command to garage device
     Commands: "open" or "close"
     """
-    if not manager.active_connections:
+    if not manager.is_connected(device_id):
         return {"error": "Garage not connected"}
     
     message = json.dumps({"command": command})
-    await manager.broadcast(message)
+    await manager.broadcast(message, device_id)
     return {"status": "Command sent"}
 
 @app.get("/api/garage/status")
-async def get_status():
+async def get_status(device_id: str = DEFAULT_DEVICE_ID):
     """
     Get current status of the garage
     """
-    status = manager.get_status()
+    status = manager.get_status(device_id)
     if not status:
         return {"error": "Garage not connected or status not available"}
     return status
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_config=None)
\ No newline at end of file
@@ -14,7 +14,7 @@ trap cleanup SIGINT
 
 # Start services in background
 echo "Starting FastAPI web service..."
-uvicorn web:app --reload --host 0.0.0.0 --port 5000 &
+uvicorn web:create_app --factory --reload --host 0.0.0.0 --port 5000 &
 
 echo "Starting Telegram bot..."
 python bot.py &
@@ -0,0 +1,55 @@
+import asyncio
+
+from misc.events import Debouncer, EventBus, StateTracker
+
+# One simulated second; the device reports every 5 s and a full move takes ~6 s
+SECOND = 0.01
+FRAME_INTERVAL = 5 * SECOND
+
+def replay(states, delay=5, hold=None, settle=20):
+    """Feeds one status frame per FRAME_INTERVAL through StateTracker into a
+    Debouncer, the way bot.py wires them, and returns what was delivered."""
+    delivered = []
+
+    async def deliver(device_id, state):
+        delivered.append((device_id, state))
+
+    async def run():
+        bus = EventBus()
+        tracker = StateTracker(bus)
+        queue = bus.subscribe()
+        debouncer = Debouncer(deliver, delay * SECOND, {k: v * SECOND for k, v in (hold or {}).items()})
+        for i, state in enumerate(states):
+            tracker.update("default", {"state": state}, i)
+            while not queue.empty():
+                event = queue.get_nowait()
+                debouncer.push(event["device_id"], event["state"], event["previous"])
+            await asyncio.sleep(FRAME_INTERVAL)
+        await asyncio.sleep(settle * SECOND)
+        debouncer.cancel()
+
+    asyncio.run(run())
+    return delivered
+
+def test_door_move_is_one_notification():
+    # "moving" is seen on two frames 5 s apart before the door reports open
+    frames = ["closed", "moving", "moving", "open", "open"]
+    assert replay(frames, hold={"moving": 15}) == [("default", "open")]
+
+def test_move_seen_on_one_frame_is_one_notification():
+    frames = ["closed", "moving", "open", "open"]
+    assert replay(frames, hold={"moving": 15}) == [("default", "open")]
+
+def test_move_back_to_start_is_not_notified():
+    frames = ["open", "moving", "open"]
+    assert replay(frames, hold={"moving": 15}) == []
+
+def test_stuck_door_is_notified_once():
+    frames = ["closed", "moving"] + ["moving"] * 4
+    assert replay(frames, hold={"moving": 15}) == [("default", "moving")]
+
+def test_trailing_delay_restarts_on_each_change():
+    # Without a hold, a 5 s quiet period is needed: the 5 s frame spacing
+    # keeps restarting it until the state settles
+    frames = ["closed", "moving", "open", "open"]
+    assert replay(frames, delay=6) == [("default", "open")]
@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+from misc.ratelimit import LoginGuard, RateLimiter
+
+def test_bucket_refills_at_rate():
+    limiter = RateLimiter(rate=2, per=1.0)
+    assert limiter.allow("k", now=0) == 0
+    assert limiter.allow("k", now=0) == 0
+    assert limiter.allow("k", now=0) == pytest.approx(0.5)
+    assert limiter.allow("k", now=0.25) == pytest.approx(0.25)
+    assert limiter.allow("k", now=0.5) == 0
+
+def test_bucket_does_not_refill_past_burst():
+    limiter = RateLimiter(rate=1, per=1.0, burst=2)
+    limiter.allow("k", now=0)
+    assert [limiter.allow("k", now=100) for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+
+def test_least_recently_used_key_is_evicted():
+    limiter = RateLimiter(rate=1, per=60.0, max_keys=2)
+    limiter.allow("a", now=0)
+    limiter.allow("b", now=0)
+    assert limiter.allow("a", now=0) > 0  # touches a, so b is now the oldest
+    limiter.allow("c", now=0)
+    assert list(limiter._buckets) == ["a", "c"]
+    # An evicted key starts over with a full bucket
+    assert limiter.allow("b", now=0) == 0
+
+def test_backoff_schedule():
+    guard = LoginGuard(path=":memory:", max_failures=3, base_lockout=30, max_lockout=3600)
+    assert [guard.lockout(n) for n in range(1, 10)] == [0, 0, 30, 60, 120, 240, 480, 960, 1920]
+    assert guard.lockout(20) == 3600
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "ratelimit.db")
+
+def test_third_failure_locks_key_for_both_processes(store_path):
+    web = LoginGuard(path=store_path)
+    bot = LoginGuard(path=store_path)
+    for _ in range(2):
+        assert web.check("ip:1") == 0
+        web.failure("ip:1")
+    assert web.check("ip:1") == 0
+    web.failure("ip:1")
+    assert web.check("ip:1") == pytest.approx(30, abs=1)
+    assert bot.check_shared("ip:1") == pytest.approx(30, abs=1)
+    bot.success("ip:1")
+    assert LoginGuard(path=store_path).check("ip:1") == 0
+
+def test_global_budget_is_shared(store_path):
+    web = LoginGuard(path=store_path, global_rate=4)
+    bot = LoginGuard(path=store_path, global_rate=4)
+    waits = [guard.check(f"key{i}") for i, guard in enumerate([web, bot] * 3)]
+    assert waits[:4] == [0, 0, 0, 0]
+    assert all(0 < wait <= 0.25 for wait in waits[4:])
+
+def test_rejections_of_known_limits_do_not_touch_the_store(store_path):
+    guard = LoginGuard(path=store_path, global_rate=1)
+    assert guard.check("a") == 0
+    assert guard.check("b") > 0
+
+    class Unavailable:
+        def execute(self, *args):
+            raise AssertionError("store used on a cached rejection")
+
+    guard._conn = Unavailable()
+    assert guard.check("c") > 0
+
+def test_garage_budget_slows_guessing_without_locking_out(store_path):
+    guard = LoginGuard(path=store_path, garage_rate=3, garage_per=0.3)
+    for i in range(3):
+        guard.failure(f"ip:{i}", garage_id=7)
+    # Any source is slowed down, but only until the next token refills
+    assert 0 < guard.check("ip:new", garage_id=7) <= 0.1
+    assert guard.check("ip:new", garage_id=8) == 0
+    time.sleep(0.15)
+    assert guard.check("ip:other", garage_id=7) == 0
@@ -1,39 +1,46 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-from fastapi import FastAPI, Depends, HTTPException, Security
+from fastapi import APIRouter, FastAPI, Depends, HTTPException, Request, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 import jwt
 from datetime import datetime, timedelta
-from typing import Optional
 import os
 import math
 import random
-import json
-from pydantic import BaseModel
 from misc.garageapi import GarageAPI
-from misc.db import get_db, User, SystemConfig, Log
-from misc.bankapi import AsyncBankClient, PaymentRequest
+from misc.db import get_db, init_db, User, Log, DEFAULT_GARAGE_ID
 from misc.config_manager import ConfigManager
 from misc.utils import distance
 from misc.models import LocationData, LoginData, PurchaseData
-from pydantic import BaseModel, constr
+from misc.ratelimit import login_guard
+from misc.logs import setup_logging, correlation_middleware
 
-app = FastAPI()
+router = APIRouter()
 security = HTTPBearer()
 
-# CORS configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  # Add your frontend URL
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def create_app() -> FastAPI:
+    """App factory: run with `uvicorn web:create_app --factory`."""
+    setup_logging()
+    init_db()
+
+    app = FastAPI()
+    app.middleware("http")(correlation_middleware)
+
+    # CORS configuration
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:3000"],  # Add your frontend URL
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    app.include_router(router)
+    return app
 
 # Constants
-GARAGE_LOCATION = json.loads(os.getenv("GARAGE_LOCATION"))
 JWT_SECRET = os.getenv("JWT_SECRET", "your-secret-key")
 JWT_ALGORITHM = "HS256"
 
@@ -41,43 +48,69 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Security(
     try:
         token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        # Tokens issued before multi-garage support belong to the default garage
+        payload.setdefault("garage_id", DEFAULT_GARAGE_ID)
         return payload
     except:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-@app.post("/api/login")
-async def login(login_data: LoginData):
+@router.post("/api/login")
+async def login(login_data: LoginData, request: Request):
+    # Checked before any DB work so a flood of guesses stays cheap
+    guard_key = f"ip:{request.client.host}"
+    wait = login_guard.check(guard_key, login_data.garage_id)
+    if wait:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
     db = next(get_db())
-    current_pass = ConfigManager.get_temp_password(db)
+    if not ConfigManager.get_garage(db, login_data.garage_id):
+        raise HTTPException(status_code=404, detail="Garage not found")
+    current_pass = ConfigManager.get_temp_password(db, login_data.garage_id)
     
     if login_data.password == current_pass:
         user_id = random.randint(10000, 99999)
         token = jwt.encode(
             {
                 "user_id": user_id,
+                "garage_id": login_data.garage_id,
                 "exp": datetime.utcnow() + timedelta(hours=24)
             },
             JWT_SECRET,
             algorithm=JWT_ALGORITHM
         )
-        ConfigManager.reset_temp_password(db)
+        ConfigManager.reset_temp_password(db, login_data.garage_id)
+        login_guard.success(guard_key)
         return {"token": token}
     
+    login_guard.failure(guard_key, login_data.garage_id)
     raise HTTPException(status_code=401, detail="Invalid password")
 
-@app.get("/api/status")
-async def get_status(_: dict = Depends(get_current_user)):
+@router.get("/api/status")
+async def get_status(user: dict = Depends(get_current_user)):
+    db = next(get_db())
+    garage = ConfigManager.get_garage(db, user["garage_id"])
+    if not garage:
+        raise HTTPException(status_code=404, detail="Garage not found")
     try:
-        status = await GarageAPI.get_status()
+        status = await GarageAPI.get_status(garage.device_id)
         return status
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/buy")
+@router.post("/api/buy")
 async def buy_garage(purchase_data: PurchaseData):
     db = next(get_db())
     GARAGE_PRICE = float(os.getenv("GARAGE_PRICE", "100.0"))
+    garage = ConfigManager.get_garage(db, purchase_data.garage_id)
+    if not garage:
+        raise HTTPException(status_code=404, detail="Garage not found")
     
+    from misc.bankapi import AsyncBankClient, PaymentRequest
+
     try:
         payment = PaymentRequest(
             amount=GARAGE_PRICE,
@@ -90,15 +123,17 @@ async def buy_garage(purchase_data: PurchaseData):
             response = await bank.process_payment(payment)
         
         if response.status == "success":
-            # Remove all old users
-            db.query(User).delete()
+            # Remove all old users of this garage
+            db.query(User).filter_by(garage_id=garage.id).delete()
+            garage.owner_id = None
             db.commit()
             
             # Create new temporary password
-            temp_password = ConfigManager.reset_temp_password(db)
+            temp_password = ConfigManager.reset_temp_password(db, garage.id)
             
             # Log the purchase
             log = Log(
+                garage_id=garage.id,
                 user="web_purchase",
                 action="garage_purchased",
                 timestamp=int(datetime.utcnow().timestamp())
@@ -119,11 +154,11 @@ async def buy_garage(purchase_data: PurchaseData):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/verify-token")
+@router.get("/api/verify-token")
 async def verify_token(current_user: dict = Depends(get_current_user)):
     return {"valid": True}
 
-@app.post("/api/garage/{action}")
+@router.post("/api/garage/{action}")
 async def control_garage(
     action: str,
     location: LocationData,
@@ -132,20 +167,25 @@ async def control_garage(
     if action not in ['left', 'right']:
         raise HTTPException(status_code=400, detail="Invalid action")
     
+    db = next(get_db())
+    garage = ConfigManager.get_garage(db, user["garage_id"])
+    if not garage:
+        raise HTTPException(status_code=404, detail="Garage not found")
+    
     dist = distance(
         location.latitude,
         location.longitude,
-        GARAGE_LOCATION[0],
-        GARAGE_LOCATION[1]
+        garage.latitude,
+        garage.longitude
     )
     
     if dist > 1000:
         raise HTTPException(status_code=400, detail="Too far from garage")
     
-    db = next(get_db())
-    result = await GarageAPI.open(action, db, user["user_id"])
+    result = await GarageAPI.open(action, db, user["user_id"], garage.device_id)
     
     log = Log(
+        garage_id=garage.id,
         user=str(user["user_id"]),
         action=action,
         timestamp=int(datetime.utcnow().timestamp())
@@ -155,10 +195,10 @@ async def control_garage(
     
     return {"result": result}
 
-@app.get("/api/logs")
-async def get_logs(_: dict = Depends(get_current_user)):
+@router.get("/api/logs")
+async def get_logs(user: dict = Depends(get_current_user)):
     db = next(get_db())
-    logs = db.query(Log).order_by(Log.timestamp.desc()).limit(50).all()
+    logs = db.query(Log).filter_by(garage_id=user["garage_id"]).order_by(Log.timestamp.desc()).limit(50).all()
     return [{
         'timestamp': datetime.fromtimestamp(log.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
         'user': log.user,
@@ -167,4 +207,4 @@ async def get_logs(_: dict = Depends(get_current_user)):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000, log_config=None)
\ No newline at end of file
@@ -95,11 +95,11 @@ start_services() {
     # Start FastAPI backend (API)
     echo "Starting FastAPI API backend..."
     cd server
-    uvicorn web:app --host 0.0.0.0 --port 5000 --reload &
+    uvicorn web:create_app --factory --host 0.0.0.0 --port 5000 &
     
     # Start FastAPI backend (WebSocket)
     echo "Starting FastAPI WebSocket backend..."
-    uvicorn server:app --host 0.0.0.0 --port 8000 --reload &
+    uvicorn server:app --host 0.0.0.0 --port 8000 &
     
     # Start Telegram bot
     echo "Starting Telegram bot..."